@@ -2,15 +2,47 @@ import json
 import re
 import os
 import sys  # <--- 명령줄 인수를 받기 위해 'sys' 모듈 추가
+import functools
+import hashlib
+import pickle
 from collections import defaultdict
 
+# (선택) google-re2 백엔드: DFA 기반이라 수천 개 API alternation도 선형 시간에 매칭됩니다.
+# 설치되어 있지 않으면 표준 're'로 자동 폴백합니다. (pip install google-re2)
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
+
+# (선택) orjson: C 확장 JSON 파서 — 큰 API 리스트 로드가 수 배 빨라집니다.
+# 없으면 표준 json으로 폴백합니다.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (선택) pyahocorasick: 리터럴 사전 전용 멀티 패턴 매처 — 키워드 수와 무관하게
+# 블록당 한 번의 선형 스캔으로 끝납니다. 없으면 정규식 경로로 폴백합니다.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # --- 1. 설정 ---
 
 # '위험 API 리스트'가 담긴 JSON 파일 (필수)
 API_LIST_JSON = "categorized_api_list.json"
 
+# 파싱/빌드가 끝난 키워드 테이블의 pickle 캐시 저장 위치 (JSON 내용 해시로 무효화)
+CACHE_DIR = os.path.expanduser("~/.cache/extract")
+
+# 호출마다 재컴파일하지 않도록 모듈 로드 시 1회만 컴파일하는 정규식들
+FUNCTION_SPLIT_RX = re.compile(r"(/[*] Function:.*? [*]/.*?)(?=/[*] Function:|\Z)", re.DOTALL)
+FUNC_NAME_RX = re.compile(r'FUN_\w+')
+
 # (제거됨) DECOMPILED_FILE = "Untitled-1.c" <-- 이 부분을 인수로 대체
 
+@functools.lru_cache(maxsize=1)
 def load_dangerous_keywords():
     """
     categorized_api_list.json을 로드하여,
@@ -18,8 +50,8 @@ def load_dangerous_keywords():
     형태의 딕셔너리로 변환합니다.
     """
     try:
-        with open(API_LIST_JSON, 'r', encoding='utf-8') as f:
-            categorized_apis = json.load(f)
+        with open(API_LIST_JSON, 'rb') as f:
+            raw = f.read()
     except FileNotFoundError:
         print(f"❌ 오류: '{API_LIST_JSON}' 파일을 찾을 수 없습니다.")
         print("   먼저 build_categorized_api_list.py 스크립트를 실행해주세요.")
@@ -28,6 +60,30 @@ def load_dangerous_keywords():
         print(f"❌ 오류: '{API_LIST_JSON}' 파일 로드 실패 - {e}")
         return None
 
+    # JSON 내용 해시를 키로 한 pickle 캐시 — 같은 API 리스트면 재파싱/재빌드를 건너뜀
+    cache_path = os.path.join(
+        CACHE_DIR, f"api_list_{hashlib.blake2b(raw, digest_size=8).hexdigest()}.pkl")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                keyword_to_category, lower_to_original, keyword_scanner = pickle.load(f)
+            if keyword_scanner is None:
+                # 스캐너 객체가 pickle되지 않는 백엔드였던 경우 여기서 재빌드
+                keyword_scanner = _build_keyword_scanner(keyword_to_category)
+            print(f"✅ 총 {len(keyword_to_category)}개의 고유 위험 API 키워드를 로드했습니다. (캐시)")
+            return keyword_to_category, lower_to_original, keyword_scanner
+        except Exception:
+            pass  # 캐시가 깨졌으면 무시하고 새로 빌드
+
+    try:
+        if orjson is not None:
+            categorized_apis = orjson.loads(raw)
+        else:
+            categorized_apis = json.loads(raw.decode('utf-8'))
+    except Exception as e:
+        print(f"❌ 오류: '{API_LIST_JSON}' 파일 로드 실패 - {e}")
+        return None
+
     # {API_이름: [카테고리1, 카테고리2...]} 딕셔너리로 역변환
     keyword_to_category = {}
     for category, apis in categorized_apis.items():
@@ -35,16 +91,83 @@ def load_dangerous_keywords():
             if api_name not in keyword_to_category:
                 keyword_to_category[api_name] = []
             keyword_to_category[api_name].append(category)
-            
+
+    # 소문자 매치 텍스트 → 원본 키워드 복원용 역인덱스 (매치마다 전체 사전을 도는 대신 O(1) 조회)
+    lower_to_original = {k.lower(): k for k in keyword_to_category}
+
+    # 키워드 스캐너(오토마톤 또는 정규식)도 로드 시점에 1회만 빌드해 함께 반환
+    # (extract_suspicious_functions를 파일마다 호출해도 재컴파일 비용이 없음)
+    keyword_scanner = _build_keyword_scanner(keyword_to_category)
+
+    # 다음 실행을 위해 캐시에 저장 (실패해도 동작에는 영향 없음)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        try:
+            payload = pickle.dumps((keyword_to_category, lower_to_original, keyword_scanner))
+        except Exception:
+            # re2 패턴 등 pickle 불가능한 스캐너는 제외하고 딕셔너리만 캐시
+            payload = pickle.dumps((keyword_to_category, lower_to_original, None))
+        with open(cache_path, 'wb') as f:
+            f.write(payload)
+    except Exception:
+        pass
+
     print(f"✅ 총 {len(keyword_to_category)}개의 고유 위험 API 키워드를 로드했습니다.")
-    return keyword_to_category
+    return keyword_to_category, lower_to_original, keyword_scanner
+
+def _build_keyword_automaton(dangerous_keywords):
+    """위험 API 이름(소문자)으로 Aho-Corasick 오토마톤을 빌드합니다. (원본 키를 값으로 저장)"""
+    automaton = ahocorasick.Automaton()
+    for k in dangerous_keywords:
+        automaton.add_word(k.lower(), k)
+    automaton.make_automaton()
+    return automaton
+
+def _ac_scan(automaton, func_block):
+    """
+    오토마톤으로 블록을 한 번만 훑어, \\b 경계를 만족하는 원본 키워드 목록을 반환합니다.
+    (정규식 alternation과 달리 키워드 수가 늘어도 블록당 비용이 일정합니다.)
+    """
+    blk = func_block.lower()
+    n = len(blk)
+    hits = []
+    for end_idx, original in automaton.iter(blk):
+        start_idx = end_idx - len(original) + 1
+        # 정규식 \b에 해당하는 단어 경계 검사
+        if start_idx > 0:
+            c = blk[start_idx - 1]
+            if c.isalnum() or c == '_':
+                continue
+        if end_idx + 1 < n:
+            c = blk[end_idx + 1]
+            if c.isalnum() or c == '_':
+                continue
+        hits.append(original)
+    return hits
+
+def _build_keyword_scanner(dangerous_keywords):
+    """
+    위험 API 키워드용 스캐너를 빌드합니다.
+    pyahocorasick이 있으면 오토마톤을, 없으면 alternation 정규식을 반환합니다.
+    """
+    if ahocorasick is not None:
+        return _build_keyword_automaton(dangerous_keywords)
+    # r'\b(CreateRemoteThread|VirtualAlloc|...)\b'
+    keyword_pattern = r'\b(' + '|'.join(re.escape(k) for k in dangerous_keywords.keys()) + r')\b'
+    return _re.compile(keyword_pattern, _re.IGNORECASE)
 
-def extract_suspicious_functions(decompiled_file_path, dangerous_keywords):
+def extract_suspicious_functions(decompiled_file_path, dangerous_keywords, lower_to_original=None, keyword_scanner=None):
     """
     디컴파일된 C 파일을 함수(FUN_...) 단위로 분할하고,
     위험 API 키워드가 포함된 함수 블록만 추출합니다.
     """
-    
+    # 역인덱스/스캐너를 직접 넘기지 않은 호출자를 위한 폴백 (1회 빌드)
+    if lower_to_original is None:
+        lower_to_original = {k.lower(): k for k in dangerous_keywords}
+    if keyword_scanner is None:
+        keyword_scanner = _build_keyword_scanner(dangerous_keywords)
+
+
     # 1. 디컴파일된 C 파일 로드
     try:
         with open(decompiled_file_path, 'r', encoding='utf-8') as f:
@@ -57,50 +180,69 @@ def extract_suspicious_functions(decompiled_file_path, dangerous_keywords):
         return
 
     # 2. C 코드를 함수 블록 단위로 분할 (Ghidra 주석 기준)
-    function_regex = re.compile(r"(/[*] Function:.*? [*]/.*?)(?=/[*] Function:|\Z)", re.DOTALL)
-    functions = function_regex.findall(code_text)
-    
-    if not functions:
-        print(f"⚠️ 경고: '{decompiled_file_path}'에서 Ghidra 함수 패턴을 찾지 못했습니다.")
-        functions = [code_text] # Fallback
+    # finditer로 블록을 하나씩 지연 생성 — findall처럼 전체 블록 리스트(원문 2번째 사본)를
+    # 미리 만들지 않으므로 큰 덤프에서 피크 메모리가 절반 수준으로 줄어듭니다.
+    def _iter_function_blocks():
+        matched = False
+        for m in FUNCTION_SPLIT_RX.finditer(code_text):
+            matched = True
+            yield m.group(1)
+        if not matched:
+            print(f"⚠️ 경고: '{decompiled_file_path}'에서 Ghidra 함수 패턴을 찾지 못했습니다.")
+            yield code_text  # Fallback
+
 
-    print(f"✅ '{decompiled_file_path}'에서 총 {len(functions)}개의 함수(청크)를 분할했습니다.")
-    
     # 3. 각 함수 블록을 'grep'하며 필터링
     suspicious_functions = []
     suspicious_summary = defaultdict(list)
     
-    # 더 빠른 검색을 위해 모든 키워드를 하나의 정규식으로 컴파일
-    # r'\b(CreateRemoteThread|VirtualAlloc|...)\b'
-    keyword_pattern = r'\b(' + '|'.join(re.escape(k) for k in dangerous_keywords.keys()) + r')\b'
-    keyword_regex = re.compile(keyword_pattern, re.IGNORECASE)
+    # 스캐너 종류 판별: 정규식에는 search가 있고, 오토마톤에는 없음
+    if hasattr(keyword_scanner, 'search'):
+        automaton = None
+        # 루프 안에서 매번 속성 조회를 하지 않도록 바운드 메서드를 지역 변수로 끌어올림
+        kw_findall = keyword_scanner.findall
+        kw_search = keyword_scanner.search
+    else:
+        automaton = keyword_scanner
 
-    for func_block in functions:
-        # 컴파일된 정규식을 사용해 함수 블록 전체에서 모든 일치 항목을 찾음
-        found_matches = keyword_regex.findall(func_block)
-        
-        if found_matches:
-            # 함수 블록을 결과에 추가
-            suspicious_functions.append(func_block)
-            
-            # 요약본 생성
-            func_name_match = re.search(r'FUN_\w+', func_block)
-            func_name = func_name_match.group(0) if func_name_match else "Unknown_Function"
-            
-            # 대소문자 구분 없이 고유한 키워드만 요약에 추가
-            unique_matches = sorted(list(set(match.lower() for match in found_matches)))
-            
-            for keyword_lower in unique_matches:
-                # 원본 키워드(대소문자 포함)를 찾기 위한 후처리
-                original_keyword = ""
-                for k in dangerous_keywords.keys():
-                    if k.lower() == keyword_lower:
-                        original_keyword = k
-                        break
-                
-                if original_keyword:
-                    categories = dangerous_keywords[original_keyword]
-                    suspicious_summary[func_name].append(f"{original_keyword} (Categories: {', '.join(categories)})")
+    block_count = 0
+    for func_block in _iter_function_blocks():
+        block_count += 1
+        if automaton is not None:
+            # 오토마톤은 한 번의 스캔으로 원본 키워드를 그대로 돌려주므로 후처리가 필요 없음
+            found_originals = _ac_scan(automaton, func_block)
+            if not found_originals:
+                continue
+        else:
+            # 먼저 search()로 존재 여부만 확인 — 키워드가 하나도 없는 블록(대부분)은
+            # findall()의 전체 매칭/리스트 생성 비용을 전혀 지불하지 않고 건너뜀
+            if not kw_search(func_block):
+                continue
+
+            # 컴파일된 정규식을 사용해 함수 블록 전체에서 모든 일치 항목을 찾음
+            found_matches = kw_findall(func_block)
+            if not found_matches:
+                continue
+
+            # 대소문자 구분 없는 매치 텍스트를 역인덱스로 원본 키워드에 O(1) 매핑
+            found_originals = [
+                lower_to_original[keyword_lower]
+                for keyword_lower in set(match.lower() for match in found_matches)
+                if keyword_lower in lower_to_original
+            ]
+
+        # 함수 블록을 결과에 추가
+        suspicious_functions.append(func_block)
+
+        # 요약본 생성
+        func_name_match = FUNC_NAME_RX.search(func_block)
+        func_name = func_name_match.group(0) if func_name_match else "Unknown_Function"
+
+        for original_keyword in sorted(set(found_originals), key=str.lower):
+            categories = dangerous_keywords[original_keyword]
+            suspicious_summary[func_name].append(f"{original_keyword} (Categories: {', '.join(categories)})")
+
+    print(f"✅ '{decompiled_file_path}'에서 총 {block_count}개의 함수(청크)를 분할했습니다.")
 
     # 4. 최종 결과 파일 저장
     if not suspicious_functions:
@@ -118,28 +260,52 @@ def extract_suspicious_functions(decompiled_file_path, dangerous_keywords):
         
         print(f"\n🎉 성공: 총 {len(suspicious_functions)}개의 위험 함수를 '{output_file}'에 저장했습니다.")
         
-        print("\n--- [ 발견된 위험 API 요약 ] ---")
+        # 요약도 한 번에 조합해서 단일 print로 출력 (라인당 print 호출 제거)
+        summary_lines = ["\n--- [ 발견된 위험 API 요약 ] ---"]
         for func, keywords in suspicious_summary.items():
-            print(f"📁 {func}:")
-            for kw in keywords:
-                print(f"  - {kw}")
+            summary_lines.append(f"📁 {func}:")
+            summary_lines.extend(f"  - {kw}" for kw in keywords)
+        print("\n".join(summary_lines))
         
     except Exception as e:
         print(f"❌ 오류: 최종 파일 저장 중 문제가 발생했습니다 - {e}")
 
+# --- 병렬 처리 (여러 파일 입력 시) ---
+
+# 워커 프로세스마다 한 번만 키워드를 로드해 두기 위한 전역 변수
+_worker_keywords = None
+
+def _init_worker():
+    """ProcessPoolExecutor 워커 초기화: 키워드 테이블을 프로세스당 1회 로드"""
+    global _worker_keywords
+    _worker_keywords = load_dangerous_keywords()
+
+def _scan_one(decompiled_file_path):
+    """워커에서 파일 하나를 스캔 (파일 간 공유 상태 없음)"""
+    if _worker_keywords:
+        keyword_to_category, lower_to_original, keyword_scanner = _worker_keywords
+        extract_suspicious_functions(decompiled_file_path, keyword_to_category, lower_to_original, keyword_scanner)
+
 # --- 스크립트 실행 ---
 if __name__ == "__main__":
     # 1. 명령줄 인수 확인
     if len(sys.argv) < 2:
         print("❌ 오류: 분석할 디컴파일된 C 파일의 경로를 인수로 제공해야 합니다.")
-        print("👉 사용법: python extract_suspicious_functions.py /경로/파일.c")
+        print("👉 사용법: python extract_suspicious_functions.py /경로/파일.c [파일2.c ...]")
         sys.exit(1)
-        
-    decompiled_file_path = sys.argv[1]
 
-    # 2. 위험 API 키워드 로드
-    dangerous_keywords = load_dangerous_keywords()
-    
-    # 3. 키워드 로드 성공 시 분석 실행
-    if dangerous_keywords:
-        extract_suspicious_functions(decompiled_file_path, dangerous_keywords)
\ No newline at end of file
+    input_paths = sys.argv[1:]
+
+    if len(input_paths) > 1:
+        # 파일별 스캔은 서로 독립적(CPU 바운드)이므로 프로세스 풀로 병렬 처리
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(initializer=_init_worker) as executor:
+            list(executor.map(_scan_one, input_paths))
+    else:
+        # 2. 위험 API 키워드 로드
+        loaded = load_dangerous_keywords()
+
+        # 3. 키워드 로드 성공 시 분석 실행
+        if loaded:
+            keyword_to_category, lower_to_original, keyword_scanner = loaded
+            extract_suspicious_functions(input_paths[0], keyword_to_category, lower_to_original, keyword_scanner)
\ No newline at end of file
@@ -9,10 +9,12 @@ import google.generativeai as genai
 # ★★★ 모든 작업이 이 디렉토리에서 수행된다고 가정합니다. ★★★
 PRODUCTION_DIR = "/home/ghidra/production"
 
-# 헬퍼 스크립트 경로
+# 헬퍼 스크립트 경로 (Ghidra 디컴파일만 외부 프로세스로 실행)
 DECOMPILE_SCRIPT = "/home/ghidra/Downloads/ghidra_11.4.2_PUBLIC_20250826/ghidra_11.4.2_PUBLIC/decompile.sh"
-EXTRACT_SCRIPT = os.path.join(PRODUCTION_DIR, "extract.py")
-SEARCH_SCRIPT = os.path.join(PRODUCTION_DIR, "search_and_extract.py")
+
+# extract/search 단계는 서브프로세스 대신 같은 프로세스에서 모듈로 직접 호출합니다.
+# (호출마다 CPython 기동 + faiss/torch 임포트 비용 수백 ms 제거, API JSON도 1회만 로드)
+sys.path.insert(0, PRODUCTION_DIR)
 
 # LLM 모델 설정
 MODEL_NAME = "gemini-2.5-flash-lite" # 또는 gemini-1.5-flash-latest
@@ -42,17 +44,19 @@ def run_command(command_list):
     쉘 명령을 실행하고, 성공 여부를 반환하며, 실시간 출력을 보여줍니다.
     """
     try:
-        # Popen을 사용하여 실시간 출력 스트리밍
-        process = subprocess.Popen(command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', cwd=PRODUCTION_DIR)
-        
-        # 실시간으로 출력 읽기
+        # Popen을 사용하여 실시간 출력 스트리밍 (바이너리 모드)
+        process = subprocess.Popen(command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=PRODUCTION_DIR)
+
+        # readline() 대신 64KB 청크 단위 os.read — Ghidra처럼 출력이 많은 자식 프로세스도
+        # 라인마다 인터프리터가 깨어나지 않고 파이프 대역폭 그대로 스트리밍됩니다.
+        fd = process.stdout.fileno()
         while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
+            chunk = os.read(fd, 65536)
+            if not chunk:  # EOF = 자식 프로세스가 파이프를 닫음
                 break
-            if output:
-                print(f"  > {output.strip()}")
-                
+            sys.stdout.write(chunk.decode('utf-8', errors='replace'))
+            sys.stdout.flush()
+
         # 프로세스 종료 대기
         process.wait()
         
@@ -181,16 +185,29 @@ def main():
         print("❌ 1단계 실패. 분석을 중단합니다.")
         sys.exit(1)
     
-    # 2단계: 위험 함수 추출
+    # 2단계: 위험 함수 추출 (in-process)
     print("\n--- 2단계: 위험 함수 추출 (extract.py) ---")
-    if not run_command(["python3", EXTRACT_SCRIPT, decompiled_c_file]):
-        print("❌ 2단계 실패. 분석을 중단합니다.")
+    try:
+        import extract
+        loaded = extract.load_dangerous_keywords()
+        if not loaded:
+            print("❌ 2단계 실패. 분석을 중단합니다.")
+            sys.exit(1)
+        keyword_to_category, lower_to_original, keyword_scanner = loaded
+        extract.extract_suspicious_functions(
+            decompiled_c_file, keyword_to_category, lower_to_original, keyword_scanner)
+    except Exception as e:
+        print(f"❌ 2단계 실패: {e}. 분석을 중단합니다.")
         sys.exit(1)
-        
-    # 3단계: 벡터 DB 유사도 검색
+
+    # 3단계: 벡터 DB 유사도 검색 (in-process)
+    # (faiss/sentence_transformers 임포트가 무거우므로 이 시점에 지연 임포트)
     print("\n--- 3단계: 벡터 DB 유사도 검색 (search_and_extract.py) ---")
-    if not run_command(["python3", SEARCH_SCRIPT, decompiled_c_file]):
-        print("❌ 3단계 실패. 분석을 중단합니다.")
+    try:
+        import search_and_extract
+        search_and_extract.run(decompiled_c_file)
+    except Exception as e:
+        print(f"❌ 3단계 실패: {e}. 분석을 중단합니다.")
         sys.exit(1)
 
     # 4단계: LLM 종합 분석
@@ -1,23 +1,72 @@
+import os
+
+# OMP 스레드 풀 크기는 torch/faiss가 '임포트되기 전'에 설정해야 반영됩니다.
+os.environ.setdefault('OMP_NUM_THREADS', str(os.cpu_count() or 1))
+
 import faiss
 from sentence_transformers import SentenceTransformer
 import numpy as np
+import functools
 import json
+import hashlib
 import re
-import os
 import sys
 import time
 
+# (선택) google-re2 백엔드: 수천 개 API alternation을 DFA로 선형 시간에 매칭합니다.
+# 설치되어 있지 않으면 표준 're'로 자동 폴백합니다. (pip install google-re2)
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
+
+# (선택) pyahocorasick: 리터럴 사전 전용 멀티 패턴 매처 — 키워드 수와 무관하게
+# 함수 블록당 한 번의 선형 스캔으로 끝납니다. 없으면 정규식 경로로 폴백합니다.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# (선택) orjson: 대용량 JSON(특히 ID 맵) 파싱이 표준 json 대비 2-5배 빠릅니다.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _load_json(path):
+    """orjson이 있으면 바이트째 파싱하고, 없으면 표준 json으로 폴백합니다."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # --- 1. 설정 ---
 FAISS_INDEX_FILE = "db/malware_code.index"  # 우리가 빌드한 벡터 DB
 ID_MAP_FILE = "db/malware_code_map.json"    # ID 맵
 MODEL_NAME = 'all-MiniLM-L6-v2'        # ★반드시★ 인덱스 생성 시 사용한 것과 동일한 모델
 API_LIST_JSON = "categorized_api_list.json" # 위험 API 키워드 파일
 
+# IVF 계열 인덱스에 적용할 최소 탐색 클러스터 수 — 실제 값은 sqrt(nlist)와의
+# 최댓값으로 잡아 인덱스 크기에 맞게 재현율/속도를 조절합니다.
+NPROBE_MIN = 8
+
+# encode 전에 함수 코드를 자를 길이(문자). 모델 한도(256 토큰)의 수 배 여유 —
+# 그 너머는 어차피 토크나이저가 잘라 버리므로 토큰화 비용만 날립니다.
+ENCODE_CLIP_CHARS = 4000
+
+# 동일 함수 본문의 (distances, indices) 검색 결과 캐시 — blake2b(본문)이 키.
+# 디컴파일 출력에 흔한 반복 썽크/스텁은 encode와 search를 통째로 건너뜁니다.
+_RESULT_CACHE = {}
+
+# Ghidra 주석 기준 함수 분할 정규식 — 호출마다 재컴파일하지 않도록 임포트 시 1회 컴파일
+FUNCTION_SPLIT_RX = re.compile(r"(/[*] Function: (FUN_\w+) [*]/.*?)(?=/[*] Function:|\Z)", re.DOTALL)
+
+@functools.lru_cache(maxsize=1)
 def load_dangerous_keywords():
     """'categorized_api_list.json'을 로드하여 검색용 정규식 생성"""
     try:
-        with open(API_LIST_JSON, 'r', encoding='utf-8') as f:
-            categorized_apis = json.load(f)
+        categorized_apis = _load_json(API_LIST_JSON)
     except FileNotFoundError:
         print(f"❌ 오류: '{API_LIST_JSON}' 파일을 찾을 수 없습니다.")
         return None
@@ -27,27 +76,108 @@ def load_dangerous_keywords():
         all_keywords.update(apis)
         
     print(f"✅ 총 {len(all_keywords)}개의 고유 위험 API 키워드를 로드했습니다.")
-    
-    keyword_pattern = r'\b(' + '|'.join(re.escape(k) for k in all_keywords) + r')\b'
-    return re.compile(keyword_pattern, re.IGNORECASE)
 
+    # pyahocorasick이 있으면 오토마톤을, 없으면 alternation 정규식을 스캐너로 반환
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for k in all_keywords:
+            automaton.add_word(k.lower(), k.lower())
+        automaton.make_automaton()
+        return automaton
+
+    # 키워드를 소문자로 통일하고 IGNORECASE 없이 컴파일 — 엔진이 문자마다
+    # 케이스 폴딩을 수행하지 않아 대형 alternation 스캔이 훨씬 가벼워집니다.
+    lowered = {k.lower() for k in all_keywords}
+    keyword_pattern = r'\b(' + '|'.join(re.escape(k) for k in lowered) + r')\b'
+    return _re.compile(keyword_pattern)
+
+def find_dangerous_keywords(scanner, func_code):
+    """함수 코드에서 발견된 위험 API 키워드(소문자) 집합을 반환합니다."""
+    blk = func_code.lower()  # 케이스 처리는 여기서 1회 — 두 경로 모두 소문자 패턴 사용
+
+    if hasattr(scanner, 'search'):
+        # 정규식 경로: 존재 여부는 search()로 싸게 판정하고, 있을 때만 수집
+        if not scanner.search(blk):
+            return set()
+        return set(m.group(1) for m in scanner.finditer(blk))
+
+    # Aho-Corasick 경로: 소문자 텍스트를 한 번만 선형 스캔 (\b 경계 검사 포함)
+    n = len(blk)
+    hits = set()
+    for end_idx, kw in scanner.iter(blk):
+        start_idx = end_idx - len(kw) + 1
+        if start_idx > 0:
+            c = blk[start_idx - 1]
+            if c.isalnum() or c == '_':
+                continue
+        if end_idx + 1 < n:
+            c = blk[end_idx + 1]
+            if c.isalnum() or c == '_':
+                continue
+        hits.add(kw)
+    return hits
+
+@functools.lru_cache(maxsize=1)
 def load_db_and_model():
-    """FAISS DB, ID 맵, 임베딩 모델 로드"""
+    """FAISS DB, ID 맵, 임베딩 모델 로드 (프로세스당 1회만 실제 수행)"""
     print("--- 1. DB 및 모델 로드 중... ---")
     start_time = time.time()
     try:
-        index = faiss.read_index(FAISS_INDEX_FILE)
+        # mmap + 읽기 전용으로 열어 인덱스 전체를 프로세스 RSS에 적재하지 않습니다.
+        # (검색이 실제로 닿는 페이지만 OS 캐시가 서빙; 미지원 인덱스 타입은 일반 로드로 폴백)
+        try:
+            index = faiss.read_index(FAISS_INDEX_FILE,
+                                     faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            index = faiss.read_index(FAISS_INDEX_FILE)
+
+        # FAISS OpenMP 스레드를 코어 수에 맞춤 — 배치 질의는 질의 단위로 병렬화됩니다.
+        faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+        # IVF 계열이면 nprobe를 클러스터 수에 맞춰 적응적으로(√nlist 경험칙) 설정
+        # (Flat 인덱스면 extract_index_ivf가 실패하므로 그대로 사용)
+        try:
+            ivf = faiss.extract_index_ivf(index)
+            ivf.nprobe = max(NPROBE_MIN, int(ivf.nlist ** 0.5))
+        except Exception:
+            pass
+
         
-        with open(ID_MAP_FILE, 'r', encoding='utf-8') as f:
-            id_map = json.load(f) # [{'id': 0, 'unique_key': '...'}, ...]
+        id_map = _load_json(ID_MAP_FILE) # [{'id': 0, 'unique_key': '...'}, ...]
         
-        # 빠른 조회를 위해 맵 구조 변경: {0: {'unique_key': '...'}, 1: ...}
-        id_lookup_map = {entry['id']: entry for entry in id_map}
+        # AoS(항목별 dict) 대신 SoA(평행 리스트) — 항목당 수백 바이트의 dict 오버헤드가
+        # 사라지고, 조회는 id로 순수 리스트 인덱싱만 수행합니다.
+        n = len(id_map)
+        src_paths = [None] * n
+        func_names = [None] * n
+        labels = [None] * n
+        for entry in id_map:
+            fid = entry['id']
+            src_paths[fid] = entry['source_file_path']
+            func_names[fid] = entry['func_name']
+            labels[fid] = entry.get('label', 'malware')
+        id_map = None  # 원본 dict 리스트는 즉시 해제
+        id_lookup = (src_paths, func_names, labels)
+
+        # PyTorch intra-op 스레드를 모든 코어로 — 일부 배포 환경은 기본 1로 잡혀
+        # model.encode가 단일 코어만 쓰는 경우가 있습니다.
+        try:
+            import torch
+            torch.set_num_threads(os.cpu_count() or 1)
+        except Exception:
+            pass
 
-        model = SentenceTransformer(MODEL_NAME)
+        # ONNX Runtime 백엔드가 가능하면 사용 — CPU encode가 보통 2~4배 빠릅니다.
+        # (optimum/onnxruntime 미설치나 변환 실패 시 기본 PyTorch 백엔드로 폴백)
+        try:
+            model = SentenceTransformer(MODEL_NAME, backend="onnx")
+        except Exception:
+            model = SentenceTransformer(MODEL_NAME)
+        # 시퀀스 한도를 명시해 과도하게 긴 입력의 토큰화/패딩 낭비를 차단
+        model.max_seq_length = 256
         
         print(f" > 로드 완료 (총 {index.ntotal}개 벡터, 소요 시간: {time.time() - start_time:.2f}초)")
-        return index, id_lookup_map, model
+        return index, id_lookup, model
         
     except Exception as e:
         print(f"❌ 오류: DB 로드 실패. '{FAISS_INDEX_FILE}'와 '{ID_MAP_FILE}'이 있는지 확인하세요.")
@@ -55,142 +185,188 @@ def load_db_and_model():
         return None, None, None
 
 def parse_c_file(c_file_path):
-    """C 파일을 함수 청크(이름, 코드) 리스트로 분할 (단일 파일 처리)"""
+    """C 파일을 함수 청크 (이름, 코드) 로 지연 분할하는 제너레이터 (단일 파일 처리)
+
+    findall()처럼 모든 블록을 리스트로 쌓지 않고 finditer()로 하나씩 내보내
+    대용량 디컴파일 파일에서도 피크 메모리가 블록 1개 수준에 머뭅니다.
+    """
     try:
         with open(c_file_path, 'r', encoding='utf-8') as f:
             code_text = f.read()
     except Exception as e:
         print(f"❌ 오류: 입력 파일 '{c_file_path}' 읽기 실패 - {e}")
-        return []
+        return
 
     # Ghidra 주석 기준으로 함수 블록과 함수 이름을 정확히 추출
-    function_regex = re.compile(r"(/[*] Function: (FUN_\w+) [*]/.*?)(?=/[*] Function:|\Z)", re.DOTALL)
-    matches = function_regex.findall(code_text)
-    
-    parsed_functions = []
-    if not matches:
+    matched = False
+    for m in FUNCTION_SPLIT_RX.finditer(code_text):
+        matched = True
+        yield (m.group(2), m.group(1))
+
+    if not matched:
         func_name = "file_" + os.path.basename(c_file_path).replace('.', '_')
-        parsed_functions.append((func_name, code_text))
-    else:
-        for (func_block, func_name) in matches:
-            parsed_functions.append((func_name, func_block))
-            
-    return parsed_functions
+        yield (func_name, code_text)
+
+@functools.lru_cache(maxsize=128)
+def _load_file_functions(file_path):
+    """출처 파일 하나를 1회만 읽어 {함수 이름: 코드 블록} 딕셔너리로 파싱해 캐시"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        code_text = f.read()
+    return {m.group(2): m.group(1) for m in FUNCTION_SPLIT_RX.finditer(code_text)}
 
 def get_function_code_from_file(file_path, target_func_name):
     """
     [핵심 기능] DB 맵에 저장된 'source_file_path'에서
-    'target_func_name'에 해당하는 실제 코드 블록을 다시 읽어옵니다.
+    'target_func_name'에 해당하는 실제 코드 블록을 읽어옵니다.
+    (같은 샘플의 여러 함수가 매칭돼도 파일 단위 캐시 덕분에 디스크는 한 번만 읽음)
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_text = f.read()
-            
-        # 정확히 그 함수만 찾기 위한 정규식
-        target_regex = re.compile(
-            r"(/[*] Function: " + re.escape(target_func_name) + r" [*]/.*?)(?=/[*] Function:|\Z)", 
-            re.DOTALL
-        )
-        match = target_regex.search(code_text)
-        
-        if match:
-            return match.group(1) # 매칭된 전체 함수 블록 반환
-        else:
-            return f"--- [오류] '{file_path}'에서 '{target_func_name}' 함수 코드를 찾지 못했습니다. ---\n"
-            
+        functions = _load_file_functions(file_path)
     except Exception as e:
         return f"--- [오류] '{file_path}' 파일 읽기 실패: {e} ---\n"
 
+    code = functions.get(target_func_name)
+    if code is not None:
+        return code # 전체 함수 블록 반환
+
+    return f"--- [오류] '{file_path}'에서 '{target_func_name}' 함수 코드를 찾지 못했습니다. ---\n"
+
 # --- 메인 실행 ---
-def main():
-    if len(sys.argv) < 2:
-        print("❌ 오류: 분석할 디컴파일된 C 파일의 경로를 인수로 제공해야 합니다.")
-        print(f"👉 사용법: python {sys.argv[0]} /경로/분석할파일.c")
-        sys.exit(1)
-        
-    input_file = sys.argv[1]
-    
+def run(input_file):
+    """파일 하나에 대해 유사도 분석을 수행합니다. (master.py가 in-process로 호출)"""
     # 1. 최종 보고서 파일 이름 설정
     base_name = os.path.basename(input_file)
     name_part, _ = os.path.splitext(base_name)
     output_report_file = f"{name_part}_similarity_report.txt"
 
     # 2. 모든 종속성 로드 (키워드, DB, 모델)
-    dangerous_keyword_regex = load_dangerous_keywords()
-    if dangerous_keyword_regex is None:
-        return
-        
-    index, id_lookup_map, model = load_db_and_model()
-    if index is None or model is None:
+    keyword_scanner = load_dangerous_keywords()
+    if keyword_scanner is None:
         return
 
-    # 3. 입력 파일 파싱 (함수 청킹)
+    # 3. 입력 파일 파싱 + 1차 패스 (제너레이터를 바로 소비해 전체 리스트를 만들지 않음)
     print(f"\n--- 2. '{input_file}' 파일 분석 시작... ---")
-    parsed_functions = parse_c_file(input_file)
-    if not parsed_functions:
-        print(" > 분석할 함수를 찾지 못했습니다. 종료합니다.")
-        return
 
-    print(f" > 총 {len(parsed_functions)}개의 함수(청크) 발견.")
-    
-    # 4. 보고서 내용을 담을 리스트
-    report_lines = [f"# '{input_file}' 파일에 대한 유사도 분석 보고서\n"]
-    total_suspicious_found = 0
     k_nearest = 3 # 상위 3개 유사 함수 검색
 
-    for func_name, func_code in parsed_functions:
-        
-        # 4a. 위험 API 키워드가 포함되어 있는지 'grep'
-        found_keywords = dangerous_keyword_regex.findall(func_code)
-        
+    # --- 1차 패스: 위험 API 키워드가 포함된 의심 함수만 수집 ---
+    total_functions = 0
+    suspicious = []
+    for func_name, func_code in parse_c_file(input_file):
+        total_functions += 1
+
+        # 위험 API 키워드가 포함되어 있는지 'grep'
+        # (스캐너 종류와 무관하게 find_dangerous_keywords가 최적 경로를 택함)
+        found_keywords = find_dangerous_keywords(keyword_scanner, func_code)
         if not found_keywords:
             continue
-            
-        # 4b. 위험 함수 발견! 보고서 섹션 추가
-        total_suspicious_found += 1
+
         print(f"\n=======================================================")
         print(f"🚨 위험 함수 감지: {func_name}")
-        keywords_str = ", ".join(sorted(list(set(k.lower() for k in found_keywords))))
+        keywords_str = ", ".join(sorted(found_keywords))
         print(f"   (근거 키워드: {keywords_str})")
-        
-        report_lines.append("\n\n" + "="*50)
-        report_lines.append(f"🚨 쿼리 함수: {func_name} (from: {input_file})")
-        report_lines.append(f"   (근거 키워드: {keywords_str})")
-        report_lines.append("--- [쿼리 함수 코드 원본] ---")
-        report_lines.append(func_code)
-        report_lines.append("\n--- [DB 유사도 검색 결과 Top 3] ---")
-
-        # 4c. 위험 함수만 벡터화하여 DB 검색
+        suspicious.append((func_name, func_code, keywords_str))
+
+    if total_functions == 0:
+        print(" > 분석할 함수를 찾지 못했습니다. 종료합니다.")
+        return
+
+    print(f"\n > 총 {total_functions}개의 함수(청크) 검사 완료.")
+    total_suspicious_found = len(suspicious)
+
+    # 보고서는 리스트에 모았다가 join하는 대신 큰 버퍼를 가진 파일로 바로 스트리밍 —
+    # 피크 메모리가 보고서 전체 크기가 아니라 버퍼 크기(1MB)에 머뭅니다.
+    try:
+        report = open(output_report_file, 'w', encoding='utf-8', buffering=1 << 20)
+    except Exception as e:
+        print(f"❌ 오류: 보고서 파일 생성 실패 - {e}")
+        return
+
+    def report_write(line):
+        report.write(line)
+        report.write("\n")
+
+    report_write(f"# '{input_file}' 파일에 대한 유사도 분석 보고서\n")
+
+    # --- 2차 패스: 의심 함수 전체를 '한 번의' encode/search 호출로 배치 처리 ---
+    # (함수마다 PyTorch 그래프 기동 + FAISS 호출을 반복하지 않아 배치 크기만큼 빨라짐)
+    if suspicious:
+        # 의심 함수가 있을 때만 무거운 FAISS 인덱스/임베딩 모델을 로드합니다.
+        # (위험 API가 전혀 없는 파일은 수 초짜리 콜드 스타트 없이 바로 보고서를 씀)
+        index, id_lookup, model = load_db_and_model()
+        if index is None or model is None:
+            report.close()
+            return
+        src_paths, func_names, labels = id_lookup
+
         start_time = time.time()
-        query_vector = model.encode([func_code]).astype('float32')
-        distances, indices = index.search(query_vector, k_nearest)
-        print(f"   > DB 검색 완료 (소요 시간: {time.time() - start_time:.4f}초)")
+        # 모델 한도 너머는 신호가 아니라 비용이므로 encode 전에 문자 단위로 잘라냄
+        codes = [code[:ENCODE_CLIP_CHARS] for _, code, _ in suspicious]
+        # 동일 본문(반복 썽크/스텁)은 encode/search를 반복하지 않도록 해시로 중복 제거
+        hashes = [hashlib.blake2b(c.encode('utf-8', 'replace'), digest_size=16).digest()
+                  for c in codes]
+        seen = set()
+        pending = []  # 캐시에 없는 고유 본문의 대표 행 번호
+        for row, h in enumerate(hashes):
+            if h not in _RESULT_CACHE and h not in seen:
+                seen.add(h)
+                pending.append(row)
+
+        if pending:
+            sub_codes = [codes[r] for r in pending]
+            # smart batching: 길이 내림차순으로 정렬해 배치 내 패딩 토큰을 최소화하고,
+            # encode 후 순열을 되돌려 원래 순서와 결과 행을 일치시킴
+            order = sorted(range(len(sub_codes)), key=lambda i: len(sub_codes[i]), reverse=True)
+            # DB가 내적(코사인) 메트릭이면 encode 단계에서 바로 단위 벡터로 정규화해
+            # 별도의 faiss.normalize_L2 후처리를 생략 (L2 인덱스는 기존 동작 유지)
+            normalize = getattr(index, 'metric_type', None) == faiss.METRIC_INNER_PRODUCT
+            embeddings = model.encode(
+                [sub_codes[i] for i in order], batch_size=32, convert_to_numpy=True,
+                show_progress_bar=False, normalize_embeddings=normalize
+            ).astype('float32', copy=False)  # 이미 float32면 버퍼 재사용 (복사 생략)
+            query_vectors = np.empty_like(embeddings)
+            query_vectors[order] = embeddings
+            new_distances, new_indices = index.search(query_vectors, k_nearest)
+            for pos, r in enumerate(pending):
+                _RESULT_CACHE[hashes[r]] = (new_distances[pos], new_indices[pos])
+
+        # 모든 행(중복 포함)을 캐시에서 채움 — 이후 리포트 루프는 기존 인덱싱 그대로
+        distances = [_RESULT_CACHE[h][0] for h in hashes]
+        indices = [_RESULT_CACHE[h][1] for h in hashes]
+        print(f"\n > 배치 벡터화 + DB 검색 완료 (의심 함수 {total_suspicious_found}개, "
+              f"소요 시간: {time.time() - start_time:.4f}초)")
 
-        # 4d. 검색 결과(유사 함수 코드) 리포트에 추가
+    for row, (func_name, func_code, keywords_str) in enumerate(suspicious):
+        report_write("\n\n" + "="*50)
+        report_write(f"🚨 쿼리 함수: {func_name} (from: {input_file})")
+        report_write(f"   (근거 키워드: {keywords_str})")
+        report_write("--- [쿼리 함수 코드 원본] ---")
+        report_write(func_code)
+        report_write("\n--- [DB 유사도 검색 결과 Top 3] ---")
+
+        # 검색 결과(유사 함수 코드) 리포트에 추가
         for i in range(k_nearest):
-            faiss_id = indices[0][i]
-            dist = distances[0][i]
-            match_info = id_lookup_map.get(faiss_id)
-            
-            if match_info:
+            faiss_id = int(indices[row][i])
+            dist = distances[row][i]
+
+            # FAISS는 이웃이 모자라면 -1을 반환하므로 범위 검사 후 인덱싱
+            if 0 <= faiss_id < len(src_paths):
+                match_path = src_paths[faiss_id]
+                match_func = func_names[faiss_id]
                 # [핵심] DB 맵에서 찾은 파일 경로와 함수 이름으로, 원본 C 코드를 다시 읽어옴
-                matched_code = get_function_code_from_file(
-                    match_info['source_file_path'], 
-                    match_info['func_name']
-                )
+                matched_code = get_function_code_from_file(match_path, match_func)
                 
-                report_lines.append(f"\n  {i+1}. [유사도 거리: {dist:.4f}]")
-                report_lines.append(f"      - 함수명: {match_info['func_name']}")
-                report_lines.append(f"      - 출처 파일: {match_info['source_file_path']}")
-                report_lines.append("      --- [유사 함수 코드] ---")
-                report_lines.append(matched_code)
+                report_write(f"\n  {i+1}. [유사도 거리: {dist:.4f}]")
+                report_write(f"      - 함수명: {match_func}")
+                report_write(f"      - 출처 파일: {match_path}")
+                report_write("      --- [유사 함수 코드] ---")
+                report_write(matched_code)
             else:
-                report_lines.append(f"\n  {i+1}. [유사도 거리: {dist:.4f}] - ID 맵 정보 없음 (ID: {faiss_id})")
+                report_write(f"\n  {i+1}. [유사도 거리: {dist:.4f}] - ID 맵 정보 없음 (ID: {faiss_id})")
 
-    # 5. 최종 보고서 파일 저장
+    # 5. 최종 보고서 파일 마감 (내용은 위에서 이미 스트리밍됨)
     try:
-        with open(output_report_file, 'w', encoding='utf-8') as f:
-            f.write("\n".join(report_lines))
+        report.close()
         
         print("\n=======================================================")
         if total_suspicious_found == 0:
@@ -201,5 +377,16 @@ def main():
     except Exception as e:
         print(f"❌ 오류: 최종 보고서 파일 저장 중 실패 - {e}")
 
+def main():
+    if len(sys.argv) < 2:
+        print("❌ 오류: 분석할 디컴파일된 C 파일의 경로를 인수로 제공해야 합니다.")
+        print(f"👉 사용법: python {sys.argv[0]} /경로/분석할파일1.c [파일2.c ...]")
+        sys.exit(1)
+
+    # 여러 파일을 주면 한 프로세스에서 순회합니다. 키워드 스캐너와 DB/모델은
+    # lru_cache 덕분에 1회만 로드되어, 수 초의 콜드 스타트가 배치 전체에 한 번만 발생.
+    for input_path in sys.argv[1:]:
+        run(input_path)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file